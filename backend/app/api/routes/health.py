@@ -1,8 +1,9 @@
 from fastapi import APIRouter, status
+from fastapi.concurrency import run_in_threadpool
 import logging
 
 from app.models.schemas import HealthResponse
-from app.services.gemini_service import gemini_service
+from app.services.gemini_service import get_gemini_service
 
 logger = logging.getLogger(__name__)
 
@@ -23,16 +24,40 @@ async def health_check():
     Returns:
         HealthResponse with status of API and Gemini connection
     """
+    gemini_service = get_gemini_service()
     if not gemini_service.enabled:
         gemini_status = "not_configured"
     else:
         try:
-            gemini_status = "connected" if gemini_service.check_connection() else "disconnected"
+            connected = await run_in_threadpool(gemini_service.check_connection)
+            gemini_status = "connected" if connected else "disconnected"
         except Exception as e:
-            logger.error(f"Error checking Gemini connection: {str(e)}")
+            logger.error("Error checking Gemini connection: %s", e)
             gemini_status = "error"
 
     return HealthResponse(
         status="healthy",
         gemini_api=gemini_status
     )
+
+
+@router.get(
+    "/health/live",
+    response_model=HealthResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Liveness Check",
+    description="Check that the API is up without contacting Gemini"
+)
+async def liveness_check():
+    """
+    Liveness endpoint for frequent probes.
+
+    Only reports whether Gemini is configured, so it never spends API quota.
+
+    Returns:
+        HealthResponse with status of API and Gemini configuration
+    """
+    return HealthResponse(
+        status="healthy",
+        gemini_api="configured" if get_gemini_service().is_configured() else "not_configured"
+    )
@@ -1,20 +1,82 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 from pathlib import Path
+from typing import Tuple
+import hashlib
 import uuid
 import logging
 import aiofiles
 import os
+import stat
 
 from app.config import settings
 from app.models.schemas import PDFAnalysisResponse, DeleteResponse, ErrorResponse, PDFMetadata
-from app.services.pdf_processor import pdf_processor, PDFProcessorError
-from app.services.gemini_service import gemini_service, GeminiServiceError
+from app.services.cache import TTLCache
+from app.services.pdf_processor import pdf_processor, PDFProcessorError, PDFValidationError
+from app.services.gemini_service import get_gemini_service, GeminiServiceError
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Size of each chunk read from the upload stream (1MB)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# PDF markers checked while streaming. Readers tolerate a few bytes before the
+# header and after the EOF marker, so each is searched within a small window.
+PDF_HEADER = b"%PDF-"
+PDF_EOF_MARKER = b"%%EOF"
+PDF_MARKER_WINDOW = 1024
+
+# Recent (metadata, analysis) results keyed by SHA-256 of the uploaded bytes,
+# so re-uploading an identical PDF skips processing and Gemini entirely
+_analysis_cache = TTLCache(
+    max_size=settings.analysis_cache_size,
+    ttl=settings.analysis_cache_ttl
+)
+
+
+def _get_pdf_path(file_id: str) -> Tuple[Path, os.stat_result]:
+    """
+    Resolve and stat the stored PDF for a file ID.
+
+    Args:
+        file_id: UUID of the PDF file
+
+    Returns:
+        Tuple of (path to the stored PDF file, its stat result)
+
+    Raises:
+        HTTPException: If the ID is not a valid UUID or the file does not exist
+    """
+    not_found = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"PDF file not found: {file_id}"
+    )
+
+    # Only accept UUIDs so user input can't escape the upload directory
+    try:
+        uuid.UUID(file_id)
+    except ValueError:
+        raise not_found
+
+    # A single stat both checks existence and feeds the response headers
+    file_path = Path(settings.upload_dir) / f"{file_id}.pdf"
+    try:
+        stat_result = file_path.stat()
+    except FileNotFoundError:
+        raise not_found
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise not_found
+
+    return file_path, stat_result
+
+
+async def _remove_file(file_path: Path) -> None:
+    """Remove a file in the thread pool, ignoring files that are already gone."""
+    await run_in_threadpool(file_path.unlink, missing_ok=True)
+
 
 @router.post(
     "/pdf/analyze",
@@ -57,67 +119,105 @@ async def analyze_pdf(file: UploadFile = File(...)):
     file_path = Path(settings.upload_dir) / saved_filename
 
     try:
-        # Read and save file
-        content = await file.read()
+        # Stream file to disk in chunks, stopping as soon as the size limit is
+        # exceeded or the first chunk shows the upload isn't a PDF
+        file_size = 0
+        has_pdf_header = True
+        tail = b""
+        hasher = hashlib.sha256()
+        async with aiofiles.open(file_path, 'wb') as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                if file_size == 0 and PDF_HEADER not in chunk[:PDF_MARKER_WINDOW]:
+                    has_pdf_header = False
+                    file_size = len(chunk)
+                    break
+                file_size += len(chunk)
+                if file_size > settings.max_file_size_bytes:
+                    break
+                await f.write(chunk)
+                hasher.update(chunk)
+                tail = (tail + chunk[-PDF_MARKER_WINDOW:])[-PDF_MARKER_WINDOW:]
 
         # Validate file size
-        file_size = len(content)
         if file_size > settings.max_file_size_bytes:
+            await _remove_file(file_path)
             raise HTTPException(
                 status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
                 detail=f"File too large. Maximum size: {settings.max_file_size_mb}MB"
             )
 
         if file_size == 0:
+            await _remove_file(file_path)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="File is empty"
             )
 
-        # Save file
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
-
-        logger.info(f"Saved PDF file: {file_path} ({file_size} bytes)")
-
-        # Validate PDF
-        if not pdf_processor.validate_pdf(str(file_path)):
-            os.remove(file_path)
+        # Fast-fail on missing PDF markers before doing a full parse
+        if not has_pdf_header or PDF_EOF_MARKER not in tail:
+            await _remove_file(file_path)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid or corrupted PDF file"
             )
 
-        # Extract text and metadata
+        logger.info("Saved PDF file: %s (%d bytes)", file_path, file_size)
+
+        # Reuse a recent analysis of identical content
+        content_hash = hasher.hexdigest()
+        cached = _analysis_cache.get(content_hash)
+        if cached is not None:
+            metadata_dict, analysis = cached
+            logger.info("Using cached analysis for content hash %s", content_hash)
+            return PDFAnalysisResponse(
+                file_id=file_id,
+                filename=file.filename,
+                analysis=analysis,
+                metadata=PDFMetadata.model_construct(**metadata_dict)
+            )
+
+        # Validate the PDF and extract text, metadata and page images (for visual
+        # analysis) from a single open; blocking work runs in the thread pool
         try:
-            text = pdf_processor.extract_text(str(file_path))
-            metadata_dict = pdf_processor.extract_metadata(str(file_path))
-            metadata = PDFMetadata(**metadata_dict)
+            extracted = await run_in_threadpool(pdf_processor.process_all, str(file_path), max_pages=5)
+        except PDFValidationError:
+            await _remove_file(file_path)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid or corrupted PDF file"
+            )
         except PDFProcessorError as e:
-            os.remove(file_path)
+            await _remove_file(file_path)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"PDF processing error: {str(e)}"
             )
 
-        # Extract page images for visual analysis
-        try:
-            images = pdf_processor.get_page_images(str(file_path), max_pages=5)
-            logger.info(f"Extracted {len(images)} page images for visual analysis")
-        except PDFProcessorError as e:
-            logger.warning(f"Failed to extract page images: {str(e)}")
-            images = None
+        text = extracted["text"]
+        metadata_dict = extracted["metadata"]
+        metadata = PDFMetadata.model_construct(**metadata_dict)
+        images = extracted["images"]
+        if images is not None:
+            logger.info("Extracted %d page images for visual analysis", len(images))
 
         # Analyze with Gemini (pass images for visual coordinate extraction)
+        gemini_service = get_gemini_service()
         try:
-            analysis = gemini_service.analyze_comprehensive(text, metadata_dict, images)
+            analysis = await gemini_service.analyze_comprehensive(
+                text, metadata_dict, images, content_hash=content_hash
+            )
         except GeminiServiceError as e:
-            logger.error(f"Gemini analysis failed: {str(e)}")
+            logger.error("Gemini analysis failed: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"AI analysis error: {str(e)}"
             )
 
+        # Only cache real analyses; mock data should reflect mock_data.json edits
+        # and parse failures should be retried on re-upload
+        if gemini_service.enabled and not gemini_service.is_parse_failure(analysis):
+            _analysis_cache.set(content_hash, (metadata_dict, analysis))
+
         # Return response
         return PDFAnalysisResponse(
             file_id=file_id,
@@ -131,9 +231,8 @@ async def analyze_pdf(file: UploadFile = File(...)):
         raise
     except Exception as e:
         # Clean up file on error
-        if file_path.exists():
-            os.remove(file_path)
-        logger.error(f"Error processing PDF: {str(e)}")
+        await _remove_file(file_path)
+        logger.error("Error processing PDF: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing PDF: {str(e)}"
@@ -146,12 +245,16 @@ async def analyze_pdf(file: UploadFile = File(...)):
     summary="Get PDF File",
     description="Retrieve a specific PDF file by ID"
 )
-async def get_pdf(file_id: str):
+async def get_pdf(file_id: str, request: Request):
     """
     Retrieve a PDF file by ID.
 
+    Returns 304 Not Modified when the client's If-None-Match header matches
+    the file's current ETag.
+
     Args:
         file_id: UUID of the PDF file
+        request: Incoming request (for conditional headers)
 
     Returns:
         PDF file
@@ -159,24 +262,28 @@ async def get_pdf(file_id: str):
     Raises:
         HTTPException: If file not found
     """
-    # Find file with this ID
-    upload_dir = Path(settings.upload_dir)
-    pdf_files = list(upload_dir.glob(f"{file_id}.pdf"))
-
-    if not pdf_files:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"PDF file not found: {file_id}"
-        )
-
-    file_path = pdf_files[0]
+    file_path, stat_result = _get_pdf_path(file_id)
 
-    return FileResponse(
+    # Passing stat_result lets FileResponse build its headers without re-statting
+    response = FileResponse(
         path=str(file_path),
         media_type="application/pdf",
-        filename=f"{file_id}.pdf"
+        filename=f"{file_id}.pdf",
+        stat_result=stat_result
     )
 
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etag = response.headers["etag"]
+        client_etags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in client_etags or etag in client_etags:
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={"etag": etag, "last-modified": response.headers["last-modified"]}
+            )
+
+    return response
+
 
 @router.delete(
     "/pdf/{file_id}",
@@ -198,28 +305,18 @@ async def delete_pdf(file_id: str):
     Raises:
         HTTPException: If file not found
     """
-    # Find file with this ID
-    upload_dir = Path(settings.upload_dir)
-    pdf_files = list(upload_dir.glob(f"{file_id}.pdf"))
-
-    if not pdf_files:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"PDF file not found: {file_id}"
-        )
-
-    file_path = pdf_files[0]
+    file_path, _ = _get_pdf_path(file_id)
 
     try:
-        os.remove(file_path)
-        logger.info(f"Deleted PDF file: {file_path}")
+        await _remove_file(file_path)
+        logger.info("Deleted PDF file: %s", file_path)
 
         return DeleteResponse(
             message="File deleted successfully",
             file_id=file_id
         )
     except Exception as e:
-        logger.error(f"Error deleting file: {str(e)}")
+        logger.error("Error deleting file: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting file: {str(e)}"
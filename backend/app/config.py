@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from functools import cached_property
+from typing import List, Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -8,6 +9,21 @@ class Settings(BaseSettings):
     # Gemini API Configuration
     gemini_api_key: Optional[str] = None
     gemini_model: str = "gemini-1.5-pro"
+    gemini_max_concurrency: int = 8  # Max in-flight Gemini requests
+    gemini_temperature: float = 0.0
+    gemini_max_output_tokens: int = 8192
+    gemini_response_schema: bool = True  # Have Gemini enforce the analysis JSON schema
+    gemini_health_check_ttl: int = 30  # Seconds to cache the connection check result
+    gemini_cache_size: int = 256  # Max cached Gemini analyses (0 disables the cache)
+    gemini_cache_ttl: int = 3600  # Seconds
+    gemini_cache_dir: Optional[str] = None  # Persist cached analyses here (default: in memory)
+    gemini_semantic_cache_size: int = 0  # Max near-duplicate cache entries (0 disables)
+    gemini_semantic_cache_threshold: float = 0.92  # Min cosine similarity for a hit
+    gemini_embedding_model: str = "models/text-embedding-004"
+    gemini_batch_pack_size: int = 1  # Documents per Gemini request in analyze_batch (1 disables packing)
+    gemini_hedge_delay: float = 30.0  # Seconds before a slow request is duplicated (0 disables)
+    gemini_max_hedges: int = 2  # Max duplicate requests in flight across all analyses
+    gemini_warmup: bool = True  # Count tokens at startup to open the async client connection
 
     # CORS Configuration
     allowed_origins: str = "http://localhost:3000"
@@ -15,20 +31,34 @@ class Settings(BaseSettings):
     # File Upload Configuration
     max_file_size_mb: int = 10
     upload_dir: str = "./uploads"
+    pdf_max_text_chars: int = 1000000  # Stop extracting PDF text past this many characters (0 = no limit)
+
+    # Analysis Cache Configuration (identical uploads reuse the previous analysis)
+    analysis_cache_size: int = 128  # Max cached analyses (0 disables the cache)
+    analysis_cache_ttl: int = 3600  # Seconds
 
     # API Configuration
     api_v1_prefix: str = "/api/v1"
 
+    # Concurrency Configuration
+    thread_pool_size: int = 40  # Max worker threads for blocking PDF/Gemini work
+    pdf_render_processes: int = 0  # Page-rendering processes (0 = one per CPU up to 4, 1 = in-process)
+
+    # Page Image Configuration
+    image_format: Literal["jpeg", "png"] = "jpeg"  # Encoding of page images sent to Gemini
+    image_jpeg_quality: int = 85
+    image_max_dimension: int = 1536  # Long-side pixel cap for page images
+
     class Config:
         env_file = ".env"
         case_sensitive = False
 
-    @property
+    @cached_property
     def allowed_origins_list(self) -> List[str]:
         """Convert comma-separated origins to list."""
         return [origin.strip() for origin in self.allowed_origins.split(",")]
 
-    @property
+    @cached_property
     def max_file_size_bytes(self) -> int:
         """Convert MB to bytes."""
         return self.max_file_size_mb * 1024 * 1024
@@ -1,11 +1,14 @@
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from pathlib import Path
+import anyio
+import asyncio
 import logging
 
 from app.config import settings
 from app.api.routes import health, pdf
+from app.services.gemini_service import get_gemini_service
 
 # Configure logging
 logging.basicConfig(
@@ -20,7 +23,8 @@ app = FastAPI(
     description="API for uploading and analyzing PDF files using Google Gemini AI",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -38,16 +42,27 @@ async def startup_event():
     """Create necessary directories on application startup."""
     upload_path = Path(settings.upload_dir)
     upload_path.mkdir(parents=True, exist_ok=True)
-    logger.info(f"Upload directory created/verified at: {upload_path.absolute()}")
-    logger.info(f"Gemini API configured with model: {settings.gemini_model}")
+    logger.info("Upload directory created/verified at: %s", upload_path.absolute())
+
+    # Bound the thread pool used for blocking PDF processing and Gemini calls
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.thread_pool_size
+    logger.info("Thread pool size: %d", settings.thread_pool_size)
+    logger.info("Gemini API configured with model: %s", settings.gemini_model)
+
+    # Create the Gemini service now rather than on the first request, and open
+    # its connection while the server is idle. The task is kept on app.state so
+    # it isn't garbage-collected before it finishes.
+    gemini_service = get_gemini_service()
+    if settings.gemini_warmup:
+        app.state.gemini_warmup_task = asyncio.create_task(gemini_service.warmup())
 
 
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Handle uncaught exceptions globally."""
-    logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    logger.error("Unhandled exception: %s", exc, exc_info=True)
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "detail": "An internal server error occurred",
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, with_config
 from typing import Dict, List, Any, Optional
+from typing_extensions import NotRequired, TypedDict
 from datetime import datetime
 
 
@@ -15,35 +16,43 @@ class PDFMetadata(BaseModel):
     modification_date: str = ""
 
 
-class Coordinate(BaseModel):
+# The analysis payload is returned as a plain dict (see PDFAnalysisResponse.analysis),
+# so its shape is described with TypedDicts - no per-element Pydantic model
+# construction happens on the response path. GeminiService validates Gemini's raw
+# JSON against AnalysisResult in a single pass; extra keys are kept as-is.
+@with_config(ConfigDict(extra="allow", coerce_numbers_to_str=True))
+class Coordinate(TypedDict):
     """Coordinate information for extracted elements."""
-    x: Dict[str, str] = Field(default_factory=dict)  # {"left_x": "...", "right_x": "..."}
-    y: Dict[str, str] = Field(default_factory=dict)  # {"lower_y": "...", "upper_y": "..."}
+    x: Dict[str, str]  # {"left_x": "...", "right_x": "..."}
+    y: Dict[str, str]  # {"lower_y": "...", "upper_y": "..."}
 
 
-class ExtractedElement(BaseModel):
+@with_config(ConfigDict(extra="allow", coerce_numbers_to_str=True))
+class ExtractedElement(TypedDict):
     """Element extracted from PDF with coordinates."""
     value: str
-    value_en: Optional[str] = None  # English translation (for annotation/title_block)
+    value_en: NotRequired[str]  # English translation (for annotation/title_block)
     coordinate: Coordinate
 
 
-class Classification(BaseModel):
+@with_config(ConfigDict(extra="allow"))
+class Classification(TypedDict):
     """Document classification information."""
     document_type: str
     industry: str
     confidence: str
 
 
-class AnalysisResult(BaseModel):
+@with_config(ConfigDict(extra="allow"))
+class AnalysisResult(TypedDict):
     """Complete analysis result from Gemini."""
     summary: str
     classification: Classification
-    dimension: List[ExtractedElement] = Field(default_factory=list)
-    annotation: List[ExtractedElement] = Field(default_factory=list)
-    title_block: List[ExtractedElement] = Field(default_factory=list)
-    others: List[ExtractedElement] = Field(default_factory=list)
-    key_insights: List[str] = Field(default_factory=list)
+    dimension: List[ExtractedElement]
+    annotation: List[ExtractedElement]
+    title_block: List[ExtractedElement]
+    others: List[ExtractedElement]
+    key_insights: List[str]
 
 
 class PDFAnalysisResponse(BaseModel):
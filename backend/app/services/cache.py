@@ -0,0 +1,386 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Protocol, Sequence, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import operator
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Prefer orjson for cache files, fall back to stdlib json
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class CacheBackend(Protocol):
+    """Storage interface used by LLMCache."""
+
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache with per-entry expiry."""
+
+    def __init__(self, max_size: int, ttl: float):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of entries kept (0 disables caching)
+            ttl: Default time-to-live for entries, in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a cached value.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value, evicting the least recently used entry if full.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Time-to-live in seconds (defaults to the cache's ttl)
+        """
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FileCache:
+    """
+    JSON file-per-entry cache that survives restarts.
+
+    Values must be JSON-serializable. Expiry uses wall-clock time since entries
+    outlive the process. The entry count is tracked in memory rather than by
+    listing the directory; once it exceeds max_size the oldest files are pruned
+    down to PRUNE_RATIO of max_size, so the directory is only scanned every so
+    often. Calls do blocking file I/O - run them off the event loop.
+    """
+
+    PRUNE_RATIO = 0.9
+
+    def __init__(self, directory: str, max_size: int, ttl: float):
+        """
+        Initialize the cache.
+
+        Args:
+            directory: Directory to store entries in (created if missing)
+            max_size: Maximum number of entries kept (0 disables caching)
+            ttl: Default time-to-live for entries, in seconds
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._count = sum(1 for _ in self.directory.glob("*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a cached value.
+
+        Args:
+            key: Cache key (used as the file name)
+
+        Returns:
+            The cached value, or None if missing, expired or unreadable
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = _json_loads(f.read())
+            expires_at, value = entry["expires_at"], entry["value"]
+            if time.time() < expires_at:
+                return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning("Discarding unreadable cache entry %s: %s", path, e)
+
+        self._remove(path)
+        return None
+
+    def _remove(self, path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._count = max(0, self._count - 1)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value, pruning the oldest entries if full.
+
+        Args:
+            key: Cache key (used as the file name)
+            value: JSON-serializable value to store
+            ttl: Time-to-live in seconds (defaults to the cache's ttl)
+        """
+        if self.max_size <= 0:
+            return
+
+        entry = {"expires_at": time.time() + (self.ttl if ttl is None else ttl), "value": value}
+        path = self._path(key)
+        is_new = not path.exists()
+        # Write a temp file and rename it so readers never see a partial entry
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_json_dumps(entry))
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            if is_new:
+                self._count += 1
+            needs_prune = self._count > self.max_size
+        if needs_prune:
+            self._prune()
+
+    def _prune(self) -> None:
+        """Delete the oldest entries, leaving PRUNE_RATIO of max_size."""
+        entries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+        keep = int(self.max_size * self.PRUNE_RATIO)
+        for _, old in entries[:max(0, len(entries) - keep)]:
+            old.unlink(missing_ok=True)
+        with self._lock:
+            self._count = min(len(entries), keep)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        for path in self.directory.glob("*.json"):
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class LLMCache:
+    """Exact-match cache for LLM responses that tracks hit/miss statistics."""
+
+    def __init__(self, backend: CacheBackend, blocking: bool = False):
+        """
+        Initialize the cache.
+
+        Args:
+            backend: Storage for cached responses (e.g. TTLCache or FileCache)
+            blocking: Whether the backend does blocking I/O, in which case the
+                async methods run it in a worker thread
+        """
+        self._store = backend
+        self._blocking = blocking
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """
+        Build a stable cache key from JSON-serializable request parts.
+
+        Returns:
+            SHA-256 hex digest of the canonical JSON encoding of the parts
+        """
+        canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a cached response, recording a hit or miss.
+
+        Backend errors are logged and count as a miss, so a broken cache never
+        fails the request it was meant to speed up.
+        """
+        try:
+            value = self._store.get(key)
+        except Exception as e:
+            logger.warning("Cache lookup failed: %s", e)
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a response; backend errors are logged and otherwise ignored."""
+        try:
+            self._store.set(key, value, ttl)
+        except Exception as e:
+            logger.warning("Cache store failed: %s", e)
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        """Like get, but runs a blocking backend in a worker thread."""
+        if self._blocking:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def set_async(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Like set, but runs a blocking backend in a worker thread."""
+        if self._blocking:
+            await asyncio.to_thread(self.set, key, value, ttl)
+        else:
+            self.set(key, value, ttl)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counts and the current number of entries."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._store)}
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache over text embeddings.
+
+    Embeddings are normalized on insert so cosine similarity is a plain dot
+    product. Lookup is a linear scan, which is fast enough for the few hundred
+    entries this is meant to hold.
+    """
+
+    def __init__(self, max_size: int, threshold: float):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of entries kept (0 disables caching)
+            threshold: Minimum cosine similarity for a lookup to count as a hit
+        """
+        self.max_size = max_size
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[List[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> List[float]:
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def search(self, vector: Sequence[float]) -> Optional[Tuple[float, Any]]:
+        """
+        Find the most similar cached entry.
+
+        Args:
+            vector: Embedding of the lookup text
+
+        Returns:
+            (similarity, value) of the best match at or above the threshold,
+            or None if there is none
+        """
+        query = self._normalize(vector)
+        best_score, best_value = -1.0, None
+        with self._lock:
+            for stored, value in self._entries.values():
+                score = sum(map(operator.mul, query, stored))
+                if score > best_score:
+                    best_score, best_value = score, value
+
+        if best_score >= self.threshold:
+            self.hits += 1
+            return best_score, best_value
+        self.misses += 1
+        return None
+
+    def add(self, key: str, vector: Sequence[float], value: Any) -> None:
+        """
+        Store a value under its embedding, evicting the oldest entry if full.
+
+        Args:
+            key: Exact cache key of the entry (replaces an existing entry)
+            vector: Embedding of the entry's text
+            value: Value to store
+        """
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (self._normalize(vector), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counts and the current number of entries."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
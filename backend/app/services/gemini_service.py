@@ -1,21 +1,375 @@
 import google.generativeai as genai
-from typing import Dict, Any, Optional, List
+from google.api_core import exceptions as google_exceptions
+from pydantic import TypeAdapter, ValidationError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+import asyncio
+from typing import Dict, Any, Optional, List, Tuple, Union
 import logging
+import hashlib
 import json
+import os
+import random
+import re
+import struct
 import time
-from PIL import Image
-import io
 
 from app.config import settings
+from app.models.schemas import AnalysisResult, ExtractedElement
+from app.services.cache import CacheBackend, FileCache, LLMCache, SemanticCache, TTLCache
+
+# Prefer orjson for JSON decoding/encoding, fall back to stdlib json
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+
+    def _json_dumps_compact(obj: Any) -> bytes:
+        """Serialize to compact UTF-8 JSON bytes."""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    def _json_dumps_pretty(obj: Any) -> bytes:
+        """Serialize to indented UTF-8 JSON bytes."""
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps_compact(obj: Any) -> bytes:
+        """Serialize to compact UTF-8 JSON bytes."""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def _json_dumps_pretty(obj: Any) -> bytes:
+        """Serialize to indented UTF-8 JSON bytes."""
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of characters of PDF text sent to Gemini (to avoid token limits)
+MAX_PROMPT_TEXT_CHARS = 50000
+
+# Characters of PDF text embedded for the semantic cache; embedding models only
+# read the first couple of thousand tokens anyway
+EMBED_TEXT_CHARS = 8000
+
+# Share of the character budget kept from the start of over-long text; the rest
+# comes from the end, where drawings often carry their title block
+TRIM_HEAD_RATIO = 0.7
+_TRUNCATION_MARKER = "\n... [truncated] ...\n"
+
+# Whitespace collapsing applied before the budget is measured: horizontal runs
+# become one space and any whitespace around a newline becomes a single newline
+_INLINE_SPACE_RE = re.compile(r"[^\S\n]+")
+_LINE_BREAK_RE = re.compile(r" ?\n\s*")
+
+# Text longer than this many times the budget is cut to head and tail windows
+# of that size before collapsing, so the regexes never scan the whole document
+TRIM_WINDOW_FACTOR = 4
+
+# Archive/mock-data writes run here, off the request path. A single worker
+# keeps writes ordered so mock_data.json always ends up with the latest result.
+_save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gemini-save")
+
+# Directory for timestamped analysis archives
+GEMINI_OUTPUT_DIR = "./gemini_outputs"
+
+# Matches a response wrapped in a markdown code fence (```json ... ```). Anchored,
+# so bare JSON fails the match on its first character.
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+
+# Parses and validates a Gemini response against the analysis schema in one pass
+_ANALYSIS_ADAPTER = TypeAdapter(AnalysisResult)
+# Validates single elements when a response as a whole doesn't match the schema
+_ELEMENT_ADAPTER = TypeAdapter(ExtractedElement)
+
+# Analysis keys holding lists of extracted elements
+_ELEMENT_SECTIONS = ("dimension", "annotation", "title_block", "others")
+
+# Sections of _log_coordinate_details: (analysis key, heading, has translation)
+_COORDINATE_LOG_SECTIONS = (
+    ("annotation", "ANNOTATIONS", True),
+    ("title_block", "TITLE BLOCKS", True),
+    ("dimension", "DIMENSIONS", False),
+)
+
+# PNG files start with this signature followed by the IHDR chunk, whose first
+# eight bytes (file offset 16-24) are the big-endian width and height
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _image_part(img_bytes: bytes) -> Dict[str, Any]:
+    """Wrap encoded page image bytes as an inline Gemini blob (PNG or JPEG)."""
+    mime_type = "image/png" if img_bytes[:8] == _PNG_SIGNATURE else "image/jpeg"
+    return {"mime_type": mime_type, "data": img_bytes}
+
+
+def _collapse_whitespace(text: str) -> str:
+    """Apply _INLINE_SPACE_RE and _LINE_BREAK_RE collapsing to text."""
+    return _LINE_BREAK_RE.sub("\n", _INLINE_SPACE_RE.sub(" ", text))
+
+
+def _stringify_numbers(value: Any) -> Any:
+    """Recursively convert int/float leaves to strings, matching the str-typed schema."""
+    if isinstance(value, dict):
+        return {k: _stringify_numbers(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_stringify_numbers(v) for v in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+# Retry backoff bounds in seconds (decorrelated jitter between attempts)
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+
+# Part of every analysis cache key; bump whenever the prompt or response schema
+# changes so cached analyses from the old prompt aren't reused
+PROMPT_VERSION = 1
+
+# Static parts of the analysis prompt, built once at import. Only the small
+# metadata/content section between them is formatted per request.
+_PROMPT_INTRO = "You are an expert technical drawing and document analyzer. Analyze the following PDF document and extract structured information."
+
+_PROMPT_INSTRUCTIONS = """Help me find and extract all values in this drawing, and classify extracted values as: dimension, annotation, title block, others. Extract and list all values, even if they seem to duplicate for easier verification.
+
+For each value, include its coordinate on the image using NORMALIZED COORDINATES where:
+- (0,0) is the TOP-LEFT corner
+- (1,1) is the BOTTOM-RIGHT corner
+- All coordinate values must be in the 0-1 range
+- upper_y is the TOP edge (smaller Y value)
+- lower_y is the BOTTOM edge (larger Y value)
+
+Please don't include results from previous query: only focus on current uploaded drawing.
+
+Return the result in this JSON format:
+
+{
+    "summary": "A concise 2-3 sentence summary of the document's main content and purpose",
+    "classification": {
+        "document_type": "Type of document (e.g., technical drawing, engineering drawing, architectural plan, research paper, invoice, report, etc.)",
+        "industry": "Relevant industry or domain",
+        "confidence": "high/medium/low confidence in classification"
+    },
+    "dimension": [
+        {
+            "value": "extracted value from drawing",
+            "coordinate": {
+                "x": {
+                    "left_x": "left coordinate x (0-1 range)",
+                    "right_x": "right coordinate x (0-1 range)"
+                },
+                "y": {
+                    "lower_y": "lower coordinate y (0-1 range, bottom edge)",
+                    "upper_y": "upper coordinate y (0-1 range, top edge)"
+                }
+            }
+        }
+    ],
+    "annotation": [
+        {
+            "value": "extracted annotation text in original language",
+            "value_en": "English translation of the annotation text",
+            "coordinate": {
+                "x": {
+                    "left_x": "left coordinate x (0-1 range)",
+                    "right_x": "right coordinate x (0-1 range)"
+                },
+                "y": {
+                    "lower_y": "lower coordinate y (0-1 range, bottom edge)",
+                    "upper_y": "upper coordinate y (0-1 range, top edge)"
+                }
+            }
+        }
+    ],
+    "title_block": [
+        {
+            "value": "title block information in original language",
+            "value_en": "English translation of the title block text",
+            "coordinate": {
+                "x": {
+                    "left_x": "left coordinate x (0-1 range)",
+                    "right_x": "right coordinate x (0-1 range)"
+                },
+                "y": {
+                    "lower_y": "lower coordinate y (0-1 range, bottom edge)",
+                    "upper_y": "upper coordinate y (0-1 range, top edge)"
+                }
+            }
+        }
+    ],
+    "others": [
+        {
+            "value": "other extracted information",
+            "coordinate": {
+                "x": {
+                    "left_x": "left coordinate x (0-1 range)",
+                    "right_x": "right coordinate x (0-1 range)"
+                },
+                "y": {
+                    "lower_y": "lower coordinate y (0-1 range, bottom edge)",
+                    "upper_y": "upper coordinate y (0-1 range, top edge)"
+                }
+            }
+        }
+    ],
+    "key_insights": [
+        "Important insight or finding about the document"
+    ]
+}
+
+CRITICAL COORDINATE REQUIREMENTS:
+- All coordinates MUST be normalized values between 0 and 1, given as JSON numbers rounded to 3 decimal places
+- (0,0) = top-left corner, (1,1) = bottom-right corner
+- For Y coordinates: upper_y < lower_y (because upper is top, lower is bottom)
+- Example: An element at the top-left might have upper_y=0.1, lower_y=0.15
+- Extract ALL values including duplicates for verification
+- Focus ONLY on the current drawing, not previous queries
+
+CONTENT EXTRACTION INSTRUCTIONS:
+- For technical drawings: Extract dimensions, annotations, title blocks with their precise coordinates
+- For non-technical documents: Set dimension, annotation, title_block as empty arrays []
+- Always include the summary, classification, and key_insights fields
+- For annotation and title_block: Provide English translation in "value_en" field
+- For dimension entries: Do NOT include "value_en" field (dimensions don't need translation)
+
+Respond ONLY with valid JSON. Do not include any other text or formatting."""
+
+# Appended to the instructions when analyze_batch packs several documents into
+# one request; each document's section is introduced by a <<<DOC n>>> marker
+_BATCH_PROMPT_SUFFIX = (
+    "\n\nThis request contains several documents. Each one starts with a <<<DOC n>>> "
+    "marker and is followed by its page images. Analyze each document separately and "
+    "respond with a JSON array whose element n is the analysis object for DOC n, "
+    "using the structure above."
+)
+
+
+def _object_schema(properties: Dict[str, Any], optional: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """Build a Gemini response schema for an object whose keys are required unless listed."""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": [key for key in properties if key not in optional]
+    }
+
+
+# Response schema enforced by Gemini (mirrors app.models.schemas.AnalysisResult).
+# Coordinates are requested as numbers, which take fewer output tokens than quoted
+# strings. _parse_response turns them into the strings the frontend overlay
+# parses: schema validation coerces them, and _repair_analysis does the same for
+# responses that fail validation as a whole.
+_STRING_SCHEMA: Dict[str, Any] = {"type": "string"}
+_COORD_SCHEMA: Dict[str, Any] = {"type": "number"}
+_ELEMENT_SCHEMA = _object_schema(
+    {
+        "value": _STRING_SCHEMA,
+        "value_en": _STRING_SCHEMA,
+        "coordinate": _object_schema({
+            "x": _object_schema({"left_x": _COORD_SCHEMA, "right_x": _COORD_SCHEMA}),
+            "y": _object_schema({"lower_y": _COORD_SCHEMA, "upper_y": _COORD_SCHEMA})
+        })
+    },
+    optional=("value_en",)
+)
+_RESPONSE_SCHEMA = _object_schema({
+    "summary": _STRING_SCHEMA,
+    "classification": _object_schema({
+        "document_type": _STRING_SCHEMA,
+        "industry": _STRING_SCHEMA,
+        "confidence": _STRING_SCHEMA
+    }),
+    "dimension": {"type": "array", "items": _ELEMENT_SCHEMA},
+    "annotation": {"type": "array", "items": _ELEMENT_SCHEMA},
+    "title_block": {"type": "array", "items": _ELEMENT_SCHEMA},
+    "others": {"type": "array", "items": _ELEMENT_SCHEMA},
+    "key_insights": {"type": "array", "items": _STRING_SCHEMA}
+})
+_BATCH_RESPONSE_SCHEMA: Dict[str, Any] = {"type": "array", "items": _RESPONSE_SCHEMA}
+
+
+# Static analysis structures, built once at import. They are shared between
+# calls, so callers must treat them (and anything returned from them) as read-only.
+_DEFAULT_VALUES: Dict[str, Any] = {
+    "summary": "No summary available",
+    "classification": {
+        "document_type": "Unknown",
+        "industry": "Unknown",
+        "confidence": "low"
+    },
+    "dimension": [],
+    "annotation": [],
+    "title_block": [],
+    "others": [],
+    "key_insights": []
+}
+
+_PARSE_FAILURE_ANALYSIS: Dict[str, Any] = {
+    "summary": "Analysis completed but response parsing failed. The document was processed successfully.",
+    "classification": {
+        "document_type": "Unknown",
+        "industry": "Unknown",
+        "confidence": "low"
+    },
+    "dimension": [],
+    "annotation": [],
+    "title_block": [],
+    "others": [],
+    "key_insights": ["Raw analysis available but structured parsing failed"]
+}
+
+_EMPTY_ANALYSIS: Dict[str, Any] = {
+    "summary": "No text content found in the document. The document may be image-based or empty.",
+    "classification": {
+        "document_type": "Empty or image-only document",
+        "industry": "Unknown",
+        "confidence": "low"
+    },
+    "dimension": [],
+    "annotation": [],
+    "title_block": [],
+    "others": [],
+    "key_insights": ["Document contains no extractable text"]
+}
+
+# Fallback mock analysis; "summary" is filled in per request from PDF metadata
+_FALLBACK_MOCK_ANALYSIS: Dict[str, Any] = {
+    "classification": {
+        "document_type": "PDF Document (No Mock Data)",
+        "industry": "General",
+        "confidence": "low"
+    },
+    "dimension": [],
+    "annotation": [],
+    "title_block": [],
+    "others": [],
+    "key_insights": [
+        "Gemini API key is not configured",
+        "mock_data.json file not found",
+        "Please upload a PDF with Gemini API enabled to generate mock_data.json",
+        "Or manually create backend/mock_data.json with analysis data"
+    ]
+}
+
 
 class GeminiServiceError(Exception):
     """Custom exception for Gemini service errors."""
     pass
 
 
+# Errors worth retrying: rate limiting, transient server/network failures and
+# empty responses. Anything else (bad request, invalid key, ...) fails fast.
+_RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    ConnectionError,
+    asyncio.TimeoutError,
+    GeminiServiceError,
+)
+
+
 class GeminiService:
     """Service for analyzing PDFs using Google Gemini API."""
 
@@ -24,24 +378,101 @@ class GeminiService:
         self.enabled = False
         self.model = None
 
+        # Caps in-flight Gemini requests across concurrent analyses
+        self._semaphore = asyncio.Semaphore(settings.gemini_max_concurrency)
+
+        # Caps duplicate (hedged) requests so slow periods don't double the load
+        self._hedge_semaphore = asyncio.Semaphore(settings.gemini_max_hedges)
+
+        # Exact-match cache of analysis results keyed by prompt inputs, kept on
+        # disk when a cache directory is configured so it survives restarts
+        backend: CacheBackend
+        if settings.gemini_cache_dir:
+            backend = FileCache(
+                settings.gemini_cache_dir,
+                max_size=settings.gemini_cache_size,
+                ttl=settings.gemini_cache_ttl
+            )
+        else:
+            backend = TTLCache(max_size=settings.gemini_cache_size, ttl=settings.gemini_cache_ttl)
+        self._cache = LLMCache(backend, blocking=isinstance(backend, FileCache))
+
+        # Near-duplicate lookup by text embedding, consulted on exact-cache misses
+        # (disabled unless gemini_semantic_cache_size > 0)
+        self._semantic_cache = SemanticCache(
+            max_size=settings.gemini_semantic_cache_size,
+            threshold=settings.gemini_semantic_cache_threshold
+        )
+
+        # Running token totals reported by Gemini (see usage_stats)
+        self._usage = {"requests": 0, "prompt_tokens": 0, "output_tokens": 0}
+
+        # Pending Gemini calls keyed by cache key (see analyze_comprehensive)
+        self._inflight: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+
+        # Parsed mock_data.json and the mtime it was read at (see _load_mock_data_from_file)
+        self._mock_cache: Optional[Tuple[int, Dict[str, Any]]] = None
+
+        # Cached result of the last connection check (see check_connection)
+        self._last_check_time: Optional[float] = None
+        self._last_check_result = False
+
         if not settings.gemini_api_key:
             logger.warning("Gemini API key not configured - analysis will return mock data")
             return
 
         try:
+            # Configure once per process. The SDK caches one gRPC client per service
+            # (sync and async), each holding a persistent HTTP/2 channel, so all
+            # requests from the shared model reuse the same connections.
             genai.configure(api_key=settings.gemini_api_key)
-            self.model = genai.GenerativeModel(settings.gemini_model)
+            # Configure generation once on the shared model: JSON mode makes
+            # Gemini return raw JSON instead of markdown-fenced text, the response
+            # schema makes it match the analysis structure, and a zero temperature
+            # with capped output keeps responses compact and deterministic
+            self.model = genai.GenerativeModel(
+                settings.gemini_model,
+                generation_config=genai.GenerationConfig(
+                    response_mime_type="application/json",
+                    response_schema=_RESPONSE_SCHEMA if settings.gemini_response_schema else None,
+                    temperature=settings.gemini_temperature,
+                    max_output_tokens=settings.gemini_max_output_tokens
+                )
+            )
+            # Analyses are only archived when Gemini is enabled; create the
+            # directory first so a failure here leaves the service on mock data
+            os.makedirs(GEMINI_OUTPUT_DIR, exist_ok=True)
             self.enabled = True
-            logger.info(f"Gemini service initialized with model: {settings.gemini_model}")
+
+            logger.info("Gemini service initialized with model: %s", settings.gemini_model)
         except Exception as e:
-            logger.error(f"Failed to initialize Gemini service: {str(e)}")
+            logger.error("Failed to initialize Gemini service: %s", e)
             logger.warning("Gemini service will return mock data")
+            return
 
-    def analyze_comprehensive(
+    async def warmup(self) -> None:
+        """
+        Open the async Gemini client's connection ahead of the first analysis.
+
+        Analyses go through the async client, so it's warmed with a token count
+        call on the same client - this sets up DNS, TLS and the HTTP/2 channel
+        without spending a billed generation request.
+        """
+        if not self.is_configured():
+            return
+
+        try:
+            await self.model.count_tokens_async("ping")
+            logger.info("Gemini warm-up finished")
+        except Exception as e:
+            logger.warning("Gemini warm-up failed: %s", e)
+
+    async def analyze_comprehensive(
         self,
         text: str,
         metadata: Dict[str, Any],
         images: Optional[List[bytes]] = None,
+        content_hash: Optional[str] = None,
         max_retries: int = 3
     ) -> Dict[str, Any]:
         """
@@ -50,15 +481,21 @@ class GeminiService:
         Args:
             text: Extracted text from PDF
             metadata: PDF metadata (page count, title, etc.)
-            images: Optional list of PDF page images (PNG bytes) for visual analysis
+            images: Optional list of PDF page images (JPEG or PNG bytes) for visual analysis
+            content_hash: Optional SHA-256 of the source PDF; when given, it keys the
+                response cache instead of hashing the text and images
             max_retries: Number of retry attempts for API calls
 
         Returns:
-            Dictionary containing analysis results with structure:
+            Dictionary containing analysis results with structure
+            (see app.models.schemas.AnalysisResult):
             {
                 "summary": str,
-                "extracted_data": dict,
                 "classification": dict,
+                "dimension": list,
+                "annotation": list,
+                "title_block": list,
+                "others": list,
                 "key_insights": list
             }
 
@@ -68,378 +505,653 @@ class GeminiService:
         # Return mock data if Gemini is not enabled
         if not self.enabled:
             logger.info("Gemini not enabled - returning mock analysis data")
-            return self._get_mock_analysis(metadata)
+            return await asyncio.to_thread(self._get_mock_analysis, metadata)
 
         if not text or not text.strip():
             logger.warning("Empty text provided for analysis")
             return self._get_empty_analysis()
 
+        # Trim once here so the prompt builder doesn't copy the text again
+        text = self._trim_text(text)
+
+        # Skip the API call entirely if identical inputs were analyzed recently
+        cache_key = self._cache_key(text, metadata, images, content_hash)
+        cached_result = await self._cache.get_async(cache_key)
+        if cached_result is not None:
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Returning cached Gemini analysis (%s)", self._cache.stats())
+            return cached_result
+
+        # Concurrent requests with identical inputs share one Gemini call. The
+        # lookup and insert happen without an await in between, so no lock is
+        # needed on the event loop. The call is shielded so a cancelled caller
+        # doesn't abort it for the others.
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._generate_analysis(cache_key, text, metadata, images, max_retries)
+            )
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(cache_key, None))
+        else:
+            logger.info("Joining in-flight Gemini analysis for identical inputs")
+
+        return await asyncio.shield(task)
+
+    async def _generate_analysis(
+        self,
+        cache_key: str,
+        text: str,
+        metadata: Dict[str, Any],
+        images: Optional[List[bytes]],
+        max_retries: int
+    ) -> Dict[str, Any]:
+        """Call Gemini with retries, then cache and archive the parsed result."""
+        embedding = None
+        if settings.gemini_semantic_cache_size > 0:
+            embedding = await self._embed(text)
+            match = self._semantic_cache.search(embedding) if embedding else None
+            if match is not None:
+                similarity, analysis_result = match
+                logger.info("Returning semantically cached Gemini analysis (similarity %.3f)", similarity)
+                await self._cache.set_async(cache_key, analysis_result)
+                return analysis_result
+
         prompt = self._build_analysis_prompt(text, metadata)
 
+        # Prepare content for Gemini once (text + images for multimodal analysis).
+        # Images are sent as raw encoded blobs, so there's no decode/re-encode, and
+        # the same parts are reused across retries.
+        content_parts: List[Any] = [prompt]
+
+        if images:
+            logger.info("Including %d page images for visual analysis", len(images))
+            content_parts.extend(_image_part(img_bytes) for img_bytes in images)
+            if logger.isEnabledFor(logging.INFO):
+                for i, img_bytes in enumerate(images):
+                    if img_bytes[:8] == _PNG_SIGNATURE and len(img_bytes) >= 24:
+                        width, height = struct.unpack(">II", img_bytes[16:24])
+                        logger.info("  Image %d: %dx%d pixels, %d bytes", i + 1, width, height, len(img_bytes))
+                    else:
+                        logger.info("  Image %d: %d bytes", i + 1, len(img_bytes))
+        else:
+            logger.info("No images provided - using text-only analysis")
+
+        wait_time = RETRY_BASE_DELAY
         for attempt in range(max_retries):
             try:
-                logger.info(f"Starting Gemini analysis (attempt {attempt + 1}/{max_retries})")
-
-                # Prepare content for Gemini (text + images for multimodal analysis)
-                content_parts = [prompt]
-
-                if images and len(images) > 0:
-                    logger.info(f"Including {len(images)} page images for visual analysis")
-                    for i, img_bytes in enumerate(images):
-                        try:
-                            # Convert bytes to PIL Image
-                            img = Image.open(io.BytesIO(img_bytes))
-                            content_parts.append(img)
-                            logger.info(f"  Image {i+1}: {img.size[0]}x{img.size[1]} pixels")
-                        except Exception as e:
-                            logger.warning(f"Failed to process image {i}: {str(e)}")
-                else:
-                    logger.info("No images provided - using text-only analysis")
+                logger.info("Starting Gemini analysis (attempt %d/%d)", attempt + 1, max_retries)
 
                 # Send to Gemini (multimodal if images provided)
-                response = self.model.generate_content(content_parts)
+                response = await self._generate_hedged(content_parts)
 
                 if not response or not response.text:
                     raise GeminiServiceError("Empty response from Gemini API")
 
+                self._record_usage(response)
+                debug = logger.isEnabledFor(logging.DEBUG)
+
                 # Log the raw response for debugging
-                logger.info("=" * 80)
-                logger.info("RAW GEMINI API RESPONSE:")
-                logger.info(response.text)
-                logger.info("=" * 80)
+                if debug:
+                    logger.debug("=" * 80)
+                    logger.debug("RAW GEMINI API RESPONSE:")
+                    logger.debug(response.text)
+                    logger.debug("=" * 80)
 
                 analysis_result = self._parse_response(response.text)
 
                 # Log parsed analysis result with coordinates
-                logger.info("=" * 80)
-                logger.info("PARSED ANALYSIS RESULT:")
-                logger.info(json.dumps(analysis_result, indent=2, ensure_ascii=False))
-                logger.info("=" * 80)
+                if debug:
+                    logger.debug("=" * 80)
+                    logger.debug("PARSED ANALYSIS RESULT:")
+                    logger.debug(_json_dumps_pretty(analysis_result).decode("utf-8"))
+                    logger.debug("=" * 80)
 
                 # Log coordinate details for overlay debugging
                 self._log_coordinate_details(analysis_result)
 
+                # Parse failures are not cached so the next request retries Gemini
+                if analysis_result is not _PARSE_FAILURE_ANALYSIS:
+                    await self._cache.set_async(cache_key, analysis_result)
+                    if embedding:
+                        self._semantic_cache.add(cache_key, embedding, analysis_result)
+
                 # Save to file for mock data generation
-                self._save_analysis_to_file(analysis_result)
+                _save_executor.submit(self._save_analysis_to_file, analysis_result, cache_key)
 
                 logger.info("Successfully completed Gemini analysis")
                 return analysis_result
 
             except Exception as e:
-                logger.warning(f"Analysis attempt {attempt + 1} failed: {str(e)}")
+                if not isinstance(e, _RETRYABLE_ERRORS):
+                    logger.error("Analysis failed with non-retryable error: %s", e)
+                    raise GeminiServiceError(f"Analysis failed: {str(e)}")
+
+                logger.warning("Analysis attempt %d failed: %s", attempt + 1, e)
                 if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt  # Exponential backoff
-                    logger.info(f"Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
+                    # Decorrelated jitter, but never sooner than the API asked for
+                    wait_time = min(RETRY_MAX_DELAY, random.uniform(RETRY_BASE_DELAY, wait_time * 3))
+                    retry_after = self._get_retry_after(e)
+                    if retry_after is not None:
+                        wait_time = min(RETRY_MAX_DELAY, max(wait_time, retry_after))
+                    logger.info("Retrying in %.1f seconds...", wait_time)
+                    await asyncio.sleep(wait_time)
                 else:
                     raise GeminiServiceError(f"Analysis failed after {max_retries} attempts: {str(e)}")
 
-    def _build_analysis_prompt(self, text: str, metadata: Dict[str, Any]) -> str:
-        """Build the analysis prompt for Gemini."""
-        page_count = metadata.get("page_count", "unknown")
-        title = metadata.get("title", "untitled")
+    async def _call_gemini(
+        self,
+        content_parts: List[Any],
+        generation_config: Optional[Dict[str, Any]] = None,
+        started: Optional[asyncio.Event] = None
+    ) -> Any:
+        """Send one generate request, respecting the concurrency limit.
 
-        prompt = f"""You are an expert technical drawing and document analyzer. Analyze the following PDF document and extract structured information.
+        `started` is set once the request holds a concurrency slot.
+        """
+        async with self._semaphore:
+            if started is not None:
+                started.set()
+            return await self.model.generate_content_async(content_parts, generation_config=generation_config)
 
-Document Metadata:
-- Title: {title}
-- Pages: {page_count}
+    async def _generate_hedged(
+        self,
+        content_parts: List[Any],
+        generation_config: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """
+        Send a generate request, duplicating it if it is slow.
 
-Document Content:
-{text[:50000]}
+        If no response arrives within `gemini_hedge_delay` seconds of the request
+        getting a concurrency slot, and both a hedge slot and a concurrency slot
+        are free, a second identical request is sent and whichever succeeds
+        first is used; the other is cancelled. If both fail, the first request's
+        error is raised.
+        """
+        started = asyncio.Event()
+        first = asyncio.ensure_future(self._call_gemini(content_parts, generation_config, started))
+        tasks = {first}
+        try:
+            delay = settings.gemini_hedge_delay
+            if delay <= 0:
+                return await first
 
-Help me find and extract all values in this drawing, and classify extracted values as: dimension, annotation, title block, others. Extract and list all values, even if they seem to duplicate for easier verification.
+            # Time spent queueing for the concurrency limit is not slowness
+            started_wait = asyncio.ensure_future(started.wait())
+            try:
+                await asyncio.wait({first, started_wait}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                started_wait.cancel()
+
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            # Don't add load when the service is already saturated
+            if done or self._hedge_semaphore.locked() or self._semaphore.locked():
+                return await first
+
+            async with self._hedge_semaphore:
+                logger.info("Gemini request exceeded %.1fs - sending a hedged request", delay)
+                tasks.add(asyncio.ensure_future(self._call_gemini(content_parts, generation_config)))
+
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            return task.result()
+
+                return first.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _trim_text(text: str, max_chars: int = MAX_PROMPT_TEXT_CHARS) -> str:
+        """
+        Collapse whitespace and fit text into the prompt budget.
 
-For each value, include its coordinate on the image using NORMALIZED COORDINATES where:
-- (0,0) is the TOP-LEFT corner
-- (1,1) is the BOTTOM-RIGHT corner
-- All coordinate values must be in the 0-1 range
-- upper_y is the TOP edge (smaller Y value)
-- lower_y is the BOTTOM edge (larger Y value)
+        Text still over budget keeps its head and tail around a truncation marker.
+        Very long text is first cut to raw head and tail windows of
+        TRIM_WINDOW_FACTOR times their share of the budget, so collapsing stays
+        bounded; only text that is mostly whitespace ends up under budget.
 
-Please don't include results from previous query: only focus on current uploaded drawing.
+        Args:
+            text: Extracted PDF text
+            max_chars: Maximum number of characters to keep
 
-Return the result in this JSON format:
+        Returns:
+            Text of at most max_chars characters
+        """
+        budget = max_chars - len(_TRUNCATION_MARKER)
+        head = int(budget * TRIM_HEAD_RATIO)
+        tail = budget - head
 
-{{
-    "summary": "A concise 2-3 sentence summary of the document's main content and purpose",
-    "classification": {{
-        "document_type": "Type of document (e.g., technical drawing, engineering drawing, architectural plan, research paper, invoice, report, etc.)",
-        "industry": "Relevant industry or domain",
-        "confidence": "high/medium/low confidence in classification"
-    }},
-    "dimension": [
-        {{
-            "value": "extracted value from drawing",
-            "coordinate": {{
-                "x": {{
-                    "left_x": "left coordinate x (0-1 range)",
-                    "right_x": "right coordinate x (0-1 range)"
-                }},
-                "y": {{
-                    "lower_y": "lower coordinate y (0-1 range, bottom edge)",
-                    "upper_y": "upper coordinate y (0-1 range, top edge)"
-                }}
-            }}
-        }}
-    ],
-    "annotation": [
-        {{
-            "value": "extracted annotation text in original language",
-            "value_en": "English translation of the annotation text",
-            "coordinate": {{
-                "x": {{
-                    "left_x": "left coordinate x (0-1 range)",
-                    "right_x": "right coordinate x (0-1 range)"
-                }},
-                "y": {{
-                    "lower_y": "lower coordinate y (0-1 range, bottom edge)",
-                    "upper_y": "upper coordinate y (0-1 range, top edge)"
-                }}
-            }}
-        }}
-    ],
-    "title_block": [
-        {{
-            "value": "title block information in original language",
-            "value_en": "English translation of the title block text",
-            "coordinate": {{
-                "x": {{
-                    "left_x": "left coordinate x (0-1 range)",
-                    "right_x": "right coordinate x (0-1 range)"
-                }},
-                "y": {{
-                    "lower_y": "lower coordinate y (0-1 range, bottom edge)",
-                    "upper_y": "upper coordinate y (0-1 range, top edge)"
-                }}
-            }}
-        }}
-    ],
-    "others": [
-        {{
-            "value": "other extracted information",
-            "coordinate": {{
-                "x": {{
-                    "left_x": "left coordinate x (0-1 range)",
-                    "right_x": "right coordinate x (0-1 range)"
-                }},
-                "y": {{
-                    "lower_y": "lower coordinate y (0-1 range, bottom edge)",
-                    "upper_y": "upper coordinate y (0-1 range, top edge)"
-                }}
-            }}
-        }}
-    ],
-    "key_insights": [
-        "Important insight or finding about the document"
-    ]
-}}
+        if len(text) > max_chars * TRIM_WINDOW_FACTOR * 2:
+            logger.info("Trimming PDF text from %d to %d characters", len(text), max_chars)
+            head_text = _collapse_whitespace(text[:head * TRIM_WINDOW_FACTOR]).lstrip()
+            tail_text = _collapse_whitespace(text[len(text) - tail * TRIM_WINDOW_FACTOR:]).rstrip()
+            return head_text[:head] + _TRUNCATION_MARKER + tail_text[max(0, len(tail_text) - tail):]
 
-CRITICAL COORDINATE REQUIREMENTS:
-- All coordinates MUST be normalized values between 0 and 1
-- (0,0) = top-left corner, (1,1) = bottom-right corner
-- For Y coordinates: upper_y < lower_y (because upper is top, lower is bottom)
-- Example: An element at the top-left might have upper_y=0.1, lower_y=0.15
-- Extract ALL values including duplicates for verification
-- Focus ONLY on the current drawing, not previous queries
+        text = _collapse_whitespace(text).strip()
+        if len(text) <= max_chars:
+            return text
 
-CONTENT EXTRACTION INSTRUCTIONS:
-- For technical drawings: Extract dimensions, annotations, title blocks with their precise coordinates
-- For non-technical documents: Set dimension, annotation, title_block as empty arrays []
-- Always include the summary, classification, and key_insights fields
-- For annotation and title_block: Provide English translation in "value_en" field
-- For dimension entries: Do NOT include "value_en" field (dimensions don't need translation)
+        logger.info("Trimming PDF text from %d to %d characters", len(text), max_chars)
+        return text[:head] + _TRUNCATION_MARKER + text[len(text) - tail:]
 
-Respond ONLY with valid JSON. Do not include any other text or formatting."""
+    @staticmethod
+    def _get_retry_after(error: Exception) -> Optional[float]:
+        """
+        Extract the server-requested retry delay from an API error, if any.
 
-        return prompt
+        Checks a Retry-After header (REST transport) and RetryInfo error
+        details (gRPC transport).
 
-    def _parse_response(self, response_text: str) -> Dict[str, Any]:
-        """Parse and validate Gemini response."""
+        Returns:
+            Delay in seconds, or None if the error carries no retry hint
+        """
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        retry_after_header = headers.get("Retry-After")
+        if retry_after_header:
+            try:
+                return float(retry_after_header)
+            except ValueError:
+                pass
+
+        for detail in getattr(error, "details", None) or []:
+            retry_delay = getattr(detail, "retry_delay", None)
+            if retry_delay is not None:
+                return retry_delay.seconds + retry_delay.nanos / 1e9
+
+        return None
+
+    async def analyze_batch(
+        self,
+        items: List[Tuple[str, Dict[str, Any], Optional[List[bytes]]]]
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Analyze several documents concurrently.
+
+        Requests overlap their network waits; the number in flight is capped
+        by `gemini_max_concurrency`. A failure in one item doesn't affect the others.
+        With `gemini_batch_pack_size` > 1, uncached documents are additionally
+        packed that many to a request (see _analyze_packed).
+
+        Args:
+            items: List of (text, metadata, images) tuples, as for analyze_comprehensive
+
+        Returns:
+            List in the same order as `items`, holding either the analysis dict
+            or the exception raised for that item
+        """
+        pack_size = settings.gemini_batch_pack_size
+        if self.enabled and pack_size > 1:
+            groups = await asyncio.gather(
+                *(self._analyze_packed(items[i:i + pack_size]) for i in range(0, len(items), pack_size))
+            )
+            results = [result for group in groups for result in group]
+        else:
+            results = await asyncio.gather(
+                *(self.analyze_comprehensive(text, metadata, images) for text, metadata, images in items),
+                return_exceptions=True
+            )
+
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error("Batch item %d failed: %s", i, result)
+
+        return results
+
+    async def _analyze_packed(
+        self,
+        items: List[Tuple[str, Dict[str, Any], Optional[List[bytes]]]]
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Analyze a group of documents with a single Gemini request.
+
+        Cached and empty documents are answered locally. If the packed request
+        fails or its response doesn't hold one valid analysis per document, the
+        remaining documents are analyzed one by one instead, with retries.
+
+        Args:
+            items: List of (text, metadata, images) tuples
+
+        Returns:
+            List in the same order as `items`, holding either the analysis dict
+            or the exception raised for that item
+        """
+        results: List[Any] = [None] * len(items)
+        pending: List[Tuple[int, str, Dict[str, Any], Optional[List[bytes]], str]] = []
+        for i, (text, metadata, images) in enumerate(items):
+            if not text or not text.strip():
+                results[i] = self._get_empty_analysis()
+                continue
+
+            text = self._trim_text(text)
+            cache_key = self._cache_key(text, metadata, images)
+            cached_result = await self._cache.get_async(cache_key)
+            if cached_result is not None:
+                results[i] = cached_result
+            else:
+                pending.append((i, text, metadata, images, cache_key))
+
+        analyses = None
+        if len(pending) > 1:
+            try:
+                analyses = await self._generate_packed(pending)
+            except Exception as e:
+                logger.warning("Packed analysis of %d documents failed, analyzing separately: %s", len(pending), e)
+
+        if analyses is None:
+            analyses = await asyncio.gather(
+                *(self.analyze_comprehensive(text, metadata, images) for _, text, metadata, images, _ in pending),
+                return_exceptions=True
+            )
+        else:
+            for (_, _, _, _, cache_key), analysis_result in zip(pending, analyses):
+                await self._cache.set_async(cache_key, analysis_result)
+                _save_executor.submit(self._save_analysis_to_file, analysis_result, cache_key)
+            logger.info("Completed packed Gemini analysis of %d documents", len(pending))
+
+        for (i, _, _, _, _), analysis_result in zip(pending, analyses):
+            results[i] = analysis_result
+        return results
+
+    async def _generate_packed(
+        self,
+        pending: List[Tuple[int, str, Dict[str, Any], Optional[List[bytes]], str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Send several documents in one request and split the JSON array response.
+
+        Raises:
+            GeminiServiceError: If the response isn't one analysis per document
+        """
+        content_parts: List[Any] = [_PROMPT_INTRO]
+        for n, (_, text, metadata, images, _) in enumerate(pending):
+            content_parts.append(f"<<<DOC {n}>>>\n{self._build_document_section(text, metadata)}")
+            content_parts.extend(_image_part(img_bytes) for img_bytes in images or [])
+        content_parts.append(_PROMPT_INSTRUCTIONS + _BATCH_PROMPT_SUFFIX)
+
+        logger.info("Starting packed Gemini analysis of %d documents", len(pending))
+        # Packed responses are an array of analyses rather than a single one
+        generation_config = {"response_schema": _BATCH_RESPONSE_SCHEMA} if settings.gemini_response_schema else None
+        response = await self._generate_hedged(content_parts, generation_config)
+        if not response or not response.text:
+            raise GeminiServiceError("Empty response from Gemini API")
+
+        self._record_usage(response)
+        response_text = response.text
+        fence_match = _FENCE_RE.match(response_text)
+        if fence_match:
+            response_text = fence_match.group(1)
+
+        payload = _json_loads(response_text)
+        if not isinstance(payload, list) or len(payload) != len(pending):
+            raise GeminiServiceError(f"Expected a JSON array of {len(pending)} analyses")
+
+        analyses = []
+        for item in payload:
+            if not isinstance(item, dict):
+                raise GeminiServiceError("Packed response element is not an object")
+            try:
+                analyses.append(_ANALYSIS_ADAPTER.validate_python(item))
+            except ValidationError:
+                analyses.append(self._repair_analysis(item))
+        return analyses
+
+    def _cache_key(
+        self,
+        text: str,
+        metadata: Dict[str, Any],
+        images: Optional[List[bytes]],
+        content_hash: Optional[str] = None
+    ) -> str:
+        """
+        Build the analysis cache key.
+
+        With a content hash of the source PDF, the key is the hash plus the
+        settings that shape the text and images derived from it. Otherwise the
+        (trimmed) text, metadata and image digests are hashed.
+        """
+        if content_hash:
+            return LLMCache.make_key(
+                model=settings.gemini_model,
+                prompt_version=PROMPT_VERSION,
+                content_hash=content_hash,
+                image_count=len(images or []),
+                image_format=settings.image_format,
+                image_jpeg_quality=settings.image_jpeg_quality,
+                image_max_dimension=settings.image_max_dimension,
+                max_text_chars=settings.pdf_max_text_chars
+            )
+
+        return LLMCache.make_key(
+            model=settings.gemini_model,
+            prompt_version=PROMPT_VERSION,
+            text=text,
+            metadata=metadata,
+            image_digests=[hashlib.sha256(img).hexdigest() for img in images or []]
+        )
+
+    async def _embed(self, text: str) -> Optional[List[float]]:
+        """
+        Embed document text for the semantic cache.
+
+        Returns:
+            The embedding, or None if the request failed (the cache is skipped)
+        """
         try:
-            # Try to find JSON in the response
-            response_text = response_text.strip()
+            result = await genai.embed_content_async(
+                model=settings.gemini_embedding_model,
+                content=text[:EMBED_TEXT_CHARS]
+            )
+            return result["embedding"]
+        except Exception as e:
+            logger.warning("Failed to embed text for semantic cache: %s", e)
+            return None
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Return analysis cache hit/miss statistics."""
+        return self._cache.stats()
 
-            # Remove markdown code blocks if present
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
+    def _record_usage(self, response: Any) -> None:
+        """Log and accumulate the token counts reported with a response."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+
+        prompt_tokens = usage.prompt_token_count or 0
+        output_tokens = usage.candidates_token_count or 0
+        self._usage["requests"] += 1
+        self._usage["prompt_tokens"] += prompt_tokens
+        self._usage["output_tokens"] += output_tokens
+        logger.info("Gemini usage: %d prompt tokens, %d output tokens", prompt_tokens, output_tokens)
+
+    def usage_stats(self) -> Dict[str, int]:
+        """Return request and token totals for the Gemini calls made so far."""
+        return dict(self._usage)
 
-            response_text = response_text.strip()
+    def semantic_cache_stats(self) -> Dict[str, int]:
+        """Return semantic cache hit/miss statistics."""
+        return self._semantic_cache.stats()
+
+    def _build_analysis_prompt(self, text: str, metadata: Dict[str, Any]) -> str:
+        """Build the analysis prompt for Gemini from already-truncated text."""
+        return f"{_PROMPT_INTRO}\n\n{self._build_document_section(text, metadata)}\n\n{_PROMPT_INSTRUCTIONS}"
 
-            # Parse JSON
-            result = json.loads(response_text)
+    def _build_document_section(self, text: str, metadata: Dict[str, Any]) -> str:
+        """Build the per-document metadata and content part of a prompt."""
+        page_count = metadata.get("page_count", "unknown")
+        title = metadata.get("title", "untitled")
 
-            # Validate structure
-            required_keys = ["summary", "classification", "dimension", "annotation", "title_block", "others", "key_insights"]
-            for key in required_keys:
-                if key not in result:
-                    logger.warning(f"Missing key in response: {key}")
-                    result[key] = self._get_default_value(key)
+        return (
+            f"Document Metadata:\n- Title: {title}\n- Pages: {page_count}\n\n"
+            f"Document Content:\n{text}"
+        )
 
-            return result
+    def _parse_response(self, response_text: str) -> Dict[str, Any]:
+        """Parse and validate Gemini response."""
+        try:
+            # JSON mode returns bare JSON; still unwrap a markdown fence in case the
+            # configured model doesn't support it
+            fence_match = _FENCE_RE.match(response_text)
+            if fence_match:
+                response_text = fence_match.group(1)
+
+            # Well-formed responses are parsed and validated in one pass
+            try:
+                return _ANALYSIS_ADAPTER.validate_json(response_text)
+            except ValidationError as e:
+                if e.errors()[0]["type"] == "json_invalid":
+                    raise json.JSONDecodeError(e.errors()[0]["msg"], response_text, 0)
+                logger.warning("Gemini response does not match the analysis schema (%d errors)", e.error_count())
+
+            # Otherwise keep what was returned, repaired to the analysis shape
+            result = _json_loads(response_text)
+            if not isinstance(result, dict):
+                logger.error("Gemini response is not a JSON object: %s", type(result).__name__)
+                return _PARSE_FAILURE_ANALYSIS
+            return self._repair_analysis(result)
 
         except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON response: {str(e)}")
-            logger.debug(f"Response text: {response_text[:500]}")
+            logger.error("Failed to parse JSON response: %s", e)
+            logger.debug("Response text: %s", response_text[:500])
             # Return structured error response
-            return {
-                "summary": "Analysis completed but response parsing failed. The document was processed successfully.",
-                "classification": {
-                    "document_type": "Unknown",
-                    "industry": "Unknown",
-                    "confidence": "low"
-                },
-                "dimension": [],
-                "annotation": [],
-                "title_block": [],
-                "others": [],
-                "key_insights": ["Raw analysis available but structured parsing failed"]
-            }
+            return _PARSE_FAILURE_ANALYSIS
+
+    def _repair_analysis(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Bring a response that failed schema validation into the analysis shape.
+
+        Missing top-level keys get defaults, and extracted elements are validated
+        one at a time so their numeric values and coordinates are still turned
+        into strings; elements that don't validate have their numbers stringified.
+        """
+        required_keys = ["summary", "classification", "dimension", "annotation", "title_block", "others", "key_insights"]
+        for key in required_keys:
+            if key not in result:
+                logger.warning("Missing key in response: %s", key)
+                result[key] = self._get_default_value(key)
+
+        for key in _ELEMENT_SECTIONS:
+            elements = result[key]
+            if not isinstance(elements, list):
+                logger.warning("Discarding non-list %s in response", key)
+                result[key] = self._get_default_value(key)
+                continue
+            for i, element in enumerate(elements):
+                try:
+                    elements[i] = _ELEMENT_ADAPTER.validate_python(element)
+                except ValidationError:
+                    elements[i] = _stringify_numbers(element)
+
+        return result
 
     def _get_default_value(self, key: str) -> Any:
         """Get default value for missing keys."""
-        defaults = {
-            "summary": "No summary available",
-            "classification": {
-                "document_type": "Unknown",
-                "industry": "Unknown",
-                "confidence": "low"
-            },
-            "dimension": [],
-            "annotation": [],
-            "title_block": [],
-            "others": [],
-            "key_insights": []
-        }
-        return defaults.get(key, None)
+        return _DEFAULT_VALUES.get(key, None)
 
     def _get_empty_analysis(self) -> Dict[str, Any]:
         """Return empty analysis structure for empty documents."""
-        return {
-            "summary": "No text content found in the document. The document may be image-based or empty.",
-            "classification": {
-                "document_type": "Empty or image-only document",
-                "industry": "Unknown",
-                "confidence": "low"
-            },
-            "dimension": [],
-            "annotation": [],
-            "title_block": [],
-            "others": [],
-            "key_insights": ["Document contains no extractable text"]
-        }
+        return _EMPTY_ANALYSIS
 
-    def _save_analysis_to_file(self, analysis_result: Dict[str, Any]) -> None:
+    def _save_analysis_to_file(self, analysis_result: Dict[str, Any], cache_key: str) -> None:
         """Save analysis result to files for archiving and mock data.
 
-        Saves to two locations:
-        1. Timestamped file in gemini_outputs/ for archiving
+        Runs on the background save executor. Saves to two locations:
+        1. Timestamped file in gemini_outputs/ for archiving, named with
+           microseconds and the start of the cache key so documents from one
+           packed batch or concurrent uploads don't overwrite each other
         2. mock_data.json for use as mock data when Gemini API is not configured
         """
         try:
-            import os
-            from datetime import datetime
-
-            # Create output directory if it doesn't exist
-            output_dir = "./gemini_outputs"
-            os.makedirs(output_dir, exist_ok=True)
-
-            # Save timestamped archive file
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            archive_file = f"{output_dir}/gemini_analysis_{timestamp}.json"
-            with open(archive_file, 'w', encoding='utf-8') as f:
-                json.dump(analysis_result, f, indent=2, ensure_ascii=False)
-            logger.info(f"Analysis archived to: {archive_file}")
-
-            # Save to mock_data.json (overwriting previous)
+            # Save timestamped archive file. Archives are rarely read by hand,
+            # so they're written compact; only mock_data.json is indented.
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            archive_file = f"{GEMINI_OUTPUT_DIR}/gemini_analysis_{timestamp}_{cache_key[:12]}.json"
+            with open(archive_file, 'wb') as f:
+                f.write(_json_dumps_compact(analysis_result))
+            logger.info("Analysis archived to: %s", archive_file)
+
+            # Save to mock_data.json (overwriting previous). Write a temp file and
+            # rename it so readers never see a partially written file.
             mock_data_file = "./mock_data.json"
-            with open(mock_data_file, 'w', encoding='utf-8') as f:
-                json.dump(analysis_result, f, indent=2, ensure_ascii=False)
-            logger.info(f"Mock data updated: {mock_data_file}")
+            tmp_file = f"{mock_data_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(_json_dumps_pretty(analysis_result))
+            os.replace(tmp_file, mock_data_file)
+            logger.info("Mock data updated: %s", mock_data_file)
             logger.info("This file will be used for mock analysis when Gemini API is not configured")
 
         except Exception as e:
-            logger.warning(f"Failed to save analysis to file: {str(e)}")
+            logger.warning("Failed to save analysis to file: %s", e)
 
     def _log_coordinate_details(self, analysis_result: Dict[str, Any]) -> None:
-        """Log detailed coordinate information for debugging overlays."""
-        logger.info("=" * 80)
-        logger.info("COORDINATE DETAILS FOR OVERLAY DEBUGGING:")
-        logger.info("Normalized coordinates: (0,0) = top-left, (1,1) = bottom-right")
-        logger.info("=" * 80)
-
-        # Log annotations
-        annotations = analysis_result.get("annotation", [])
-        if annotations:
-            logger.info(f"\nANNOTATIONS ({len(annotations)} items):")
-            for i, item in enumerate(annotations):
-                logger.info(f"\n  [{i}] Value: {item.get('value', 'N/A')}")
-                logger.info(f"      Translation: {item.get('value_en', 'N/A')}")
-                coord = item.get("coordinate", {})
-                logger.info(f"      Coordinates:")
-                logger.info(f"        X: left={coord.get('x', {}).get('left_x', 'N/A')}, right={coord.get('x', {}).get('right_x', 'N/A')}")
-                logger.info(f"        Y: lower={coord.get('y', {}).get('lower_y', 'N/A')}, upper={coord.get('y', {}).get('upper_y', 'N/A')}")
-        else:
-            logger.info("\nANNOTATIONS: None")
-
-        # Log title blocks
-        title_blocks = analysis_result.get("title_block", [])
-        if title_blocks:
-            logger.info(f"\nTITLE BLOCKS ({len(title_blocks)} items):")
-            for i, item in enumerate(title_blocks):
-                logger.info(f"\n  [{i}] Value: {item.get('value', 'N/A')}")
-                logger.info(f"      Translation: {item.get('value_en', 'N/A')}")
-                coord = item.get("coordinate", {})
-                logger.info(f"      Coordinates:")
-                logger.info(f"        X: left={coord.get('x', {}).get('left_x', 'N/A')}, right={coord.get('x', {}).get('right_x', 'N/A')}")
-                logger.info(f"        Y: lower={coord.get('y', {}).get('lower_y', 'N/A')}, upper={coord.get('y', {}).get('upper_y', 'N/A')}")
-        else:
-            logger.info("\nTITLE BLOCKS: None")
-
-        # Log dimensions (no translation)
-        dimensions = analysis_result.get("dimension", [])
-        if dimensions:
-            logger.info(f"\nDIMENSIONS ({len(dimensions)} items):")
-            for i, item in enumerate(dimensions):
-                logger.info(f"\n  [{i}] Value: {item.get('value', 'N/A')}")
-                coord = item.get("coordinate", {})
-                logger.info(f"      Coordinates:")
-                logger.info(f"        X: left={coord.get('x', {}).get('left_x', 'N/A')}, right={coord.get('x', {}).get('right_x', 'N/A')}")
-                logger.info(f"        Y: lower={coord.get('y', {}).get('lower_y', 'N/A')}, upper={coord.get('y', {}).get('upper_y', 'N/A')}")
-        else:
-            logger.info("\nDIMENSIONS: None")
+        """Log detailed coordinate information for debugging overlays (DEBUG level only)."""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
 
-        logger.info("\n" + "=" * 80)
+        # Build the whole report in one pass and emit it as a single log record
+        lines = [
+            "=" * 80,
+            "COORDINATE DETAILS FOR OVERLAY DEBUGGING:",
+            "Normalized coordinates: (0,0) = top-left, (1,1) = bottom-right",
+            "=" * 80
+        ]
+        for key, label, translated in _COORDINATE_LOG_SECTIONS:
+            items = analysis_result.get(key, [])
+            if not items:
+                lines.append(f"\n{label}: None")
+                continue
+
+            lines.append(f"\n{label} ({len(items)} items):")
+            for i, item in enumerate(items):
+                coord = item.get("coordinate", {})
+                x = coord.get("x", {})
+                y = coord.get("y", {})
+                lines.append(f"\n  [{i}] Value: {item.get('value', 'N/A')}")
+                if translated:
+                    lines.append(f"      Translation: {item.get('value_en', 'N/A')}")
+                lines.append("      Coordinates:")
+                lines.append(f"        X: left={x.get('left_x', 'N/A')}, right={x.get('right_x', 'N/A')}")
+                lines.append(f"        Y: lower={y.get('lower_y', 'N/A')}, upper={y.get('upper_y', 'N/A')}")
+        lines.append("\n" + "=" * 80)
+
+        logger.debug("\n".join(lines))
 
     def _load_mock_data_from_file(self) -> Optional[Dict[str, Any]]:
         """Load mock data from mock_data.json file.
 
+        The parsed data is cached and only re-read when the file's mtime changes.
+
         Returns:
             Dictionary containing mock analysis data, or None if file not found/invalid
         """
         try:
-            import os
             mock_data_file = "./mock_data.json"
 
-            if not os.path.exists(mock_data_file):
-                logger.warning(f"Mock data file not found: {mock_data_file}")
+            try:
+                mtime = os.stat(mock_data_file).st_mtime_ns
+            except FileNotFoundError:
+                logger.warning("Mock data file not found: %s", mock_data_file)
+                self._mock_cache = None
                 return None
 
-            with open(mock_data_file, 'r', encoding='utf-8') as f:
-                mock_data = json.load(f)
+            if self._mock_cache is not None and self._mock_cache[0] == mtime:
+                return self._mock_cache[1]
 
-            logger.info(f"Loaded mock data from: {mock_data_file}")
+            with open(mock_data_file, 'rb') as f:
+                mock_data = _json_loads(f.read())
+
+            self._mock_cache = (mtime, mock_data)
+            logger.info("Loaded mock data from: %s", mock_data_file)
             return mock_data
 
         except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON in mock data file: {str(e)}")
+            logger.error("Invalid JSON in mock data file: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Failed to load mock data file: {str(e)}")
+            logger.error("Failed to load mock data file: %s", e)
             return None
 
     def _get_mock_analysis(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
@@ -451,59 +1163,89 @@ Respond ONLY with valid JSON. Do not include any other text or formatting."""
         """
         # Try to load mock data from file
         mock_result = self._load_mock_data_from_file()
+        loaded_from_file = bool(mock_result)
 
         # Fall back to minimal default if file not found
-        if not mock_result:
+        if not loaded_from_file:
             page_count = metadata.get("page_count", 0)
             title = metadata.get("title", "PDF Document")
 
             logger.warning("Using fallback mock data (mock_data.json not found)")
             mock_result = {
                 "summary": f"This is a {page_count}-page PDF document titled '{title}'. Gemini API analysis is not configured. Please create backend/mock_data.json file or configure GEMINI_API_KEY in .env.",
-                "classification": {
-                    "document_type": "PDF Document (No Mock Data)",
-                    "industry": "General",
-                    "confidence": "low"
-                },
-                "dimension": [],
-                "annotation": [],
-                "title_block": [],
-                "others": [],
-                "key_insights": [
-                    "Gemini API key is not configured",
-                    "mock_data.json file not found",
-                    "Please upload a PDF with Gemini API enabled to generate mock_data.json",
-                    "Or manually create backend/mock_data.json with analysis data"
-                ]
+                **_FALLBACK_MOCK_ANALYSIS
             }
 
         # Log mock data source
-        logger.info("=" * 80)
-        logger.info("RETURNING MOCK ANALYSIS DATA:")
-        logger.info(f"Data loaded from: {'mock_data.json' if self._load_mock_data_from_file() else 'fallback (no file)'}")
-        logger.info("=" * 80)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("=" * 80)
+            logger.info("RETURNING MOCK ANALYSIS DATA:")
+            logger.info("Data loaded from: %s", 'mock_data.json' if loaded_from_file else 'fallback (no file)')
+            logger.info("=" * 80)
         self._log_coordinate_details(mock_result)
 
         return mock_result
 
+    @staticmethod
+    def is_parse_failure(analysis: Dict[str, Any]) -> bool:
+        """
+        Check whether an analysis is the placeholder returned for an unparseable response.
+
+        Such results should not be cached, so a re-upload asks Gemini again.
+        """
+        return analysis is _PARSE_FAILURE_ANALYSIS
+
+    def is_configured(self) -> bool:
+        """
+        Check whether the Gemini client is set up, without calling the API.
+
+        Returns:
+            True if analyses will be sent to Gemini, False if mock data is used
+        """
+        return self.enabled and self.model is not None
+
     def check_connection(self) -> bool:
         """
         Check if Gemini API connection is working.
 
+        Probes with a free token count call. The result is cached for
+        `gemini_health_check_ttl` seconds so frequent health checks don't issue
+        a Gemini request each time.
+
         Returns:
             True if connection successful, False otherwise
         """
-        if not self.enabled or not self.model:
+        if not self.is_configured():
             return False
 
+        now = time.monotonic()
+        if (
+            self._last_check_time is not None
+            and now - self._last_check_time < settings.gemini_health_check_ttl
+        ):
+            return self._last_check_result
+
         try:
-            # Simple test prompt
-            response = self.model.generate_content("Respond with 'OK'")
-            return response and response.text is not None
+            # Counting tokens exercises the API key and model without a billed,
+            # schema-bound generation
+            response = self.model.count_tokens("ping")
+            result = bool(response and response.total_tokens > 0)
         except Exception as e:
-            logger.error(f"Gemini connection check failed: {str(e)}")
-            return False
+            logger.error("Gemini connection check failed: %s", e)
+            result = False
+
+        self._last_check_time = now
+        self._last_check_result = result
+        return result
+
 
+@lru_cache(maxsize=1)
+def get_gemini_service() -> GeminiService:
+    """
+    Return the shared GeminiService instance, creating it on first call.
 
-# Create singleton instance
-gemini_service = GeminiService()
+    Importing this module doesn't configure the Gemini client. The app creates
+    the instance at startup, before requests run concurrently; tests can call
+    get_gemini_service.cache_clear() to get a fresh one.
+    """
+    return GeminiService()
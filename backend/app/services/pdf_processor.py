@@ -1,26 +1,168 @@
 import fitz  # PyMuPDF
-from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from itertools import repeat
+from typing import Any, Dict, Iterator, List, Optional
 from pathlib import Path
+import io
 import logging
+import multiprocessing
+import os
+import threading
+
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Page images are rendered at 2x zoom for better quality, but never larger than
+# settings.image_max_dimension pixels on the long side - Gemini downsizes bigger
+# images to its own tile size anyway
+RENDER_ZOOM = 2.0
+
+# MuPDF isn't thread-safe, and the API runs PDF processing on a thread pool, so
+# every PyMuPDF call made in this process holds this lock. Documents are only
+# touched inside it; parallel rendering happens in the worker processes below.
+_fitz_lock = threading.Lock()
+
+# Worker processes for rendering pages in parallel. Threads would all contend
+# for _fitz_lock, so processes are used instead; they are spawned rather than
+# forked because the parent runs gRPC threads. Created on first use and reused.
+_render_pool: Optional[ProcessPoolExecutor] = None
+_render_pool_lock = threading.Lock()
+
+
+def _render_workers() -> int:
+    """Number of page-rendering processes (setting, or one per CPU up to 4)."""
+    return settings.pdf_render_processes or min(4, os.cpu_count() or 1)
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """Return the shared page-rendering process pool, creating it on first call."""
+    global _render_pool
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                _render_pool = ProcessPoolExecutor(
+                    max_workers=_render_workers(),
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _render_pool
+
+
+def _reset_render_pool() -> None:
+    """Discard the page-rendering pool so the next call creates a new one."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=False)
+            _render_pool = None
+
+
+def _render_page_image(page: "fitz.Page") -> bytes:
+    """Render a page as JPEG or PNG (per settings.image_format), downscaling oversized pages."""
+    long_side = max(page.rect.width, page.rect.height)
+    zoom = min(RENDER_ZOOM, settings.image_max_dimension / long_side) if long_side else RENDER_ZOOM
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    if settings.image_format == "png":
+        return pix.tobytes("png")
+    return pix.tobytes("jpeg", jpg_quality=settings.image_jpeg_quality)
+
+
+def _render_page_from_file(pdf_path: str, page_num: int) -> bytes:
+    """Open a PDF and render one page (runs in a worker process)."""
+    with fitz.open(pdf_path) as doc:
+        return _render_page_image(doc[page_num])
+
 
 class PDFProcessorError(Exception):
     """Custom exception for PDF processing errors."""
     pass
 
 
+class PDFValidationError(PDFProcessorError):
+    """Raised when a file can't be opened as a PDF at all."""
+    pass
+
+
 class PDFProcessor:
     """Service for processing PDF files using PyMuPDF."""
 
     @staticmethod
-    def extract_text(pdf_path: str) -> str:
+    @contextmanager
+    def open_document(pdf_path: str) -> Iterator["fitz.Document"]:
+        """
+        Open a PDF once for several extraction steps.
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Yields:
+            The open PyMuPDF document, closed on exit
+
+        Raises:
+            PDFProcessorError: If the file doesn't exist
+            PDFValidationError: If the file can't be opened as a PDF
+        """
+        if not Path(pdf_path).exists():
+            raise PDFProcessorError(f"PDF file not found: {pdf_path}")
+
+        try:
+            with _fitz_lock:
+                doc = fitz.open(pdf_path)
+        except Exception as e:
+            logger.warning("PDF validation failed: %s", e)
+            raise PDFValidationError(f"Invalid or corrupted PDF file: {str(e)}")
+
+        try:
+            yield doc
+        finally:
+            with _fitz_lock:
+                doc.close()
+
+    @staticmethod
+    def process_all(pdf_path: str, max_pages: int = 5) -> Dict[str, Any]:
+        """
+        Validate a PDF and extract its text, metadata and page images in one open.
+
+        Image rendering is best-effort: if it fails, "images" is None.
+
+        Args:
+            pdf_path: Path to the PDF file
+            max_pages: Maximum number of pages to extract images from
+
+        Returns:
+            Dictionary with "text", "metadata" and "images" keys
+
+        Raises:
+            PDFValidationError: If the file can't be opened as a PDF
+            PDFProcessorError: If text or metadata can't be extracted
+        """
+        with PDFProcessor.open_document(pdf_path) as doc:
+            try:
+                text = PDFProcessor._extract_text_from_doc(doc, pdf_path)
+                metadata = PDFProcessor._extract_metadata_from_doc(doc)
+            except Exception as e:
+                logger.error("Error extracting content from PDF: %s", e)
+                raise PDFProcessorError(f"Failed to extract content: {str(e)}")
+
+            try:
+                images = PDFProcessor._get_page_images_from_doc(doc, pdf_path, max_pages)
+            except Exception as e:
+                logger.warning("Failed to extract page images: %s", e)
+                images = None
+
+        return {"text": text, "metadata": metadata, "images": images}
+
+    @staticmethod
+    def extract_text(pdf_path: str, max_chars: Optional[int] = None) -> str:
         """
         Extract all text content from a PDF file.
 
         Args:
             pdf_path: Path to the PDF file
+            max_chars: Stop extracting past this many characters (defaults to
+                settings.pdf_max_text_chars; 0 means no limit)
 
         Returns:
             Extracted text as a single string
@@ -29,37 +171,52 @@ class PDFProcessor:
             PDFProcessorError: If PDF cannot be processed
         """
         try:
-            if not Path(pdf_path).exists():
-                raise PDFProcessorError(f"PDF file not found: {pdf_path}")
+            with PDFProcessor.open_document(pdf_path) as doc:
+                return PDFProcessor._extract_text_from_doc(doc, pdf_path, max_chars)
+        except PDFValidationError:
+            raise
+        except Exception as e:
+            logger.error("Error extracting text from PDF: %s", e)
+            raise PDFProcessorError(f"Failed to extract text: {str(e)}")
 
-            doc = fitz.open(pdf_path)
-            text_content = []
+    @staticmethod
+    def _extract_text_from_doc(doc: "fitz.Document", pdf_path: str, max_chars: Optional[int] = None) -> str:
+        """Extract text content from an open document, stopping at max_chars (see extract_text)."""
+        if max_chars is None:
+            max_chars = settings.pdf_max_text_chars
+
+        # Write pages straight into one buffer instead of joining a list of them
+        buffer = io.StringIO()
+        pages_with_text = 0
+        length = 0
+
+        with _fitz_lock:
+            for page_num, page in enumerate(doc.pages(), start=1):
+                if max_chars and length >= max_chars:
+                    logger.warning("Stopped text extraction at page %d of %d (%d character limit)", page_num, len(doc), max_chars)
+                    break
 
-            for page_num in range(len(doc)):
-                page = doc[page_num]
                 text = page.get_text()
                 if text.strip():
-                    text_content.append(f"--- Page {page_num + 1} ---\n{text}")
-
-            doc.close()
+                    if pages_with_text:
+                        length += buffer.write("\n\n")
+                    length += buffer.write(f"--- Page {page_num} ---\n")
+                    length += buffer.write(text)
+                    pages_with_text += 1
 
-            full_text = "\n\n".join(text_content)
+        if not pages_with_text:
+            logger.warning("No text extracted from PDF: %s", pdf_path)
+            return ""
 
-            if not full_text.strip():
-                logger.warning(f"No text extracted from PDF: {pdf_path}")
-                return ""
+        full_text = buffer.getvalue()
+        if max_chars and length > max_chars:
+            full_text = full_text[:max_chars]
 
-            logger.info(f"Extracted {len(full_text)} characters from {len(text_content)} pages")
-            return full_text
-
-        except fitz.FileDataError as e:
-            raise PDFProcessorError(f"Corrupted or invalid PDF file: {str(e)}")
-        except Exception as e:
-            logger.error(f"Error extracting text from PDF: {str(e)}")
-            raise PDFProcessorError(f"Failed to extract text: {str(e)}")
+        logger.info("Extracted %d characters from %d pages", len(full_text), pages_with_text)
+        return full_text
 
     @staticmethod
-    def extract_metadata(pdf_path: str) -> Dict[str, any]:
+    def extract_metadata(pdf_path: str) -> Dict[str, Any]:
         """
         Extract metadata from a PDF file.
 
@@ -73,34 +230,35 @@ class PDFProcessor:
             PDFProcessorError: If PDF cannot be processed
         """
         try:
-            if not Path(pdf_path).exists():
-                raise PDFProcessorError(f"PDF file not found: {pdf_path}")
+            with PDFProcessor.open_document(pdf_path) as doc:
+                return PDFProcessor._extract_metadata_from_doc(doc)
+        except PDFValidationError:
+            raise
+        except Exception as e:
+            logger.error("Error extracting metadata from PDF: %s", e)
+            raise PDFProcessorError(f"Failed to extract metadata: {str(e)}")
 
-            doc = fitz.open(pdf_path)
-            metadata = doc.metadata
+    @staticmethod
+    def _extract_metadata_from_doc(doc: "fitz.Document") -> Dict[str, Any]:
+        """Extract metadata from an open document."""
+        with _fitz_lock:
+            metadata = doc.metadata or {}
             page_count = len(doc)
 
-            result = {
-                "page_count": page_count,
-                "title": metadata.get("title", ""),
-                "author": metadata.get("author", ""),
-                "subject": metadata.get("subject", ""),
-                "creator": metadata.get("creator", ""),
-                "producer": metadata.get("producer", ""),
-                "creation_date": metadata.get("creationDate", ""),
-                "modification_date": metadata.get("modDate", ""),
-            }
-
-            doc.close()
-
-            logger.info(f"Extracted metadata from PDF: {page_count} pages")
-            return result
-
-        except fitz.FileDataError as e:
-            raise PDFProcessorError(f"Corrupted or invalid PDF file: {str(e)}")
-        except Exception as e:
-            logger.error(f"Error extracting metadata from PDF: {str(e)}")
-            raise PDFProcessorError(f"Failed to extract metadata: {str(e)}")
+        # Values are always str/int: callers build PDFMetadata without validation
+        result = {
+            "page_count": page_count,
+            "title": metadata.get("title") or "",
+            "author": metadata.get("author") or "",
+            "subject": metadata.get("subject") or "",
+            "creator": metadata.get("creator") or "",
+            "producer": metadata.get("producer") or "",
+            "creation_date": metadata.get("creationDate") or "",
+            "modification_date": metadata.get("modDate") or "",
+        }
+
+        logger.info("Extracted metadata from PDF: %d pages", page_count)
+        return result
 
     @staticmethod
     def get_page_images(pdf_path: str, max_pages: int = 5) -> List[bytes]:
@@ -112,37 +270,47 @@ class PDFProcessor:
             max_pages: Maximum number of pages to extract images from
 
         Returns:
-            List of image bytes (PNG format)
+            List of image bytes (JPEG or PNG, per settings.image_format)
 
         Raises:
             PDFProcessorError: If PDF cannot be processed
         """
         try:
-            if not Path(pdf_path).exists():
-                raise PDFProcessorError(f"PDF file not found: {pdf_path}")
-
-            doc = fitz.open(pdf_path)
-            images = []
+            with PDFProcessor.open_document(pdf_path) as doc:
+                return PDFProcessor._get_page_images_from_doc(doc, pdf_path, max_pages)
+        except PDFValidationError:
+            raise
+        except Exception as e:
+            logger.error("Error extracting images from PDF: %s", e)
+            raise PDFProcessorError(f"Failed to extract images: {str(e)}")
 
+    @staticmethod
+    def _get_page_images_from_doc(doc: "fitz.Document", pdf_path: str, max_pages: int) -> List[bytes]:
+        """Render page images from an open document."""
+        with _fitz_lock:
             pages_to_process = min(len(doc), max_pages)
 
-            for page_num in range(pages_to_process):
-                page = doc[page_num]
-                # Render page as image (PNG)
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom for better quality
-                img_bytes = pix.tobytes("png")
-                images.append(img_bytes)
-
-            doc.close()
-
-            logger.info(f"Extracted {len(images)} page images from PDF")
-            return images
-
-        except fitz.FileDataError as e:
-            raise PDFProcessorError(f"Corrupted or invalid PDF file: {str(e)}")
-        except Exception as e:
-            logger.error(f"Error extracting images from PDF: {str(e)}")
-            raise PDFProcessorError(f"Failed to extract images: {str(e)}")
+        if pages_to_process < 2 or _render_workers() < 2:
+            with _fitz_lock:
+                images = [_render_page_image(doc[page_num]) for page_num in range(pages_to_process)]
+        else:
+            # Render multi-page documents in parallel, one page per worker task.
+            # Workers open their own copy of the file since documents can't be
+            # shared across processes.
+            try:
+                images = list(_get_render_pool().map(
+                    _render_page_from_file, repeat(pdf_path), range(pages_to_process)
+                ))
+            except BrokenProcessPool:
+                # A crashed worker breaks the whole pool; replace it next time
+                # and render this document in-process
+                logger.warning("Page render pool failed - rendering in-process")
+                _reset_render_pool()
+                with _fitz_lock:
+                    images = [_render_page_image(doc[page_num]) for page_num in range(pages_to_process)]
+
+        logger.info("Extracted %d page images from PDF", len(images))
+        return images
 
     @staticmethod
     def validate_pdf(pdf_path: str) -> bool:
@@ -156,11 +324,9 @@ class PDFProcessor:
             True if valid PDF, False otherwise
         """
         try:
-            doc = fitz.open(pdf_path)
-            doc.close()
-            return True
-        except Exception as e:
-            logger.warning(f"PDF validation failed: {str(e)}")
+            with PDFProcessor.open_document(pdf_path):
+                return True
+        except PDFProcessorError:
             return False
 
 